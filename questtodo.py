@@ -1,9 +1,22 @@
+from __future__ import annotations
+
 import sys
+import json
+import functools
 import sqlite3
+import atexit
+import threading
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import date, timedelta, datetime
+from pathlib import Path
 import os
 
-from PySide6.QtCore import QEvent, QPropertyAnimation, QEasingCurve
+from PySide6.QtCore import (
+    QEvent, QVariantAnimation, QEasingCurve,
+    QObject, Signal, QRunnable, QThreadPool, QTimer, QRect
+)
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget,
     QVBoxLayout, QHBoxLayout,
@@ -12,7 +25,8 @@ from PySide6.QtWidgets import (
     QLabel, QHeaderView, QLineEdit,
     QDialog, QDialogButtonBox, QMessageBox,
     QGroupBox, QListWidget, QListWidgetItem,
-    QAbstractItemView, QProgressBar
+    QAbstractItemView, QProgressBar,
+    QStyledItemDelegate, QStyle, QStyleOptionButton
 )
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QPalette, QColor
@@ -32,17 +46,25 @@ DATA_DIR = get_user_data_dir()
 os.makedirs(DATA_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(DATA_DIR, "questodo.db")
+META_PATH = os.path.join(DATA_DIR, "questodo_meta.json")
+INTEGRITY_CHECK_INTERVAL = timedelta(days=7)
 DAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+_MASK_TABLE = [[(m >> i) & 1 for i in range(7)] for m in range(128)]  # days_mask -> [0/1 по дням]
 
 
 # ---------- helpers ----------
 def monday(d: date) -> date:
     return d - timedelta(days=d.weekday())
 
-def week_label(ws: date) -> str:
+@functools.lru_cache(maxsize=16)
+def _week_label_cached(ws_ordinal: int) -> str:
+    ws = date.fromordinal(ws_ordinal)
     we = ws + timedelta(days=6)
     return f"{ws.strftime('%d.%m.%Y')} — {we.strftime('%d.%m.%Y')}"
 
+def week_label(ws: date) -> str:
+    return _week_label_cached(ws.toordinal())
+
 def mask_has_day(mask: int, day_idx_0_mon: int) -> bool:
     return ((mask >> day_idx_0_mon) & 1) == 1
 
@@ -53,27 +75,98 @@ def set_mask_day(mask: int, day_idx_0_mon: int, value: bool) -> int:
 def full_week_mask() -> int:
     return (1 << 7) - 1  # 127
 
-def daterange(d1: date, d2: date):
-    d = d1
-    while d <= d2:
-        yield d
-        d += timedelta(days=1)
+@dataclass
+class ActivitiesSoA:
+    # параллельные массивы вместо списка кортежей — для подсчётов по маскам
+    ids: array
+    names: list[str]
+    masks: array
+    mandatory: array
+
+    @classmethod
+    def from_rows(cls, rows) -> "ActivitiesSoA":
+        return cls(
+            ids=array("q", (int(r[0]) for r in rows)),
+            names=[r[1] for r in rows],
+            masks=array("B", (int(r[3]) & full_week_mask() for r in rows)),
+            mandatory=array("B", (int(r[2]) for r in rows)),
+        )
+
+    def has_mandatory(self) -> bool:
+        return 1 in self.mandatory
+
+def ids_by_weekday(acts: ActivitiesSoA, mandatory_only: bool = False) -> list[list[int]]:
+    # для каждого дня недели (0=Пн) — id активностей, запланированных на этот день
+    by_day = [[] for _ in range(7)]
+    ids, masks, mandatory = acts.ids, acts.masks, acts.mandatory
+    for k in range(len(ids)):
+        if mandatory_only and mandatory[k] != 1:
+            continue
+        m = masks[k]
+        while m:  # только по установленным битам
+            by_day[(m & -m).bit_length() - 1].append(ids[k])
+            m &= m - 1
+    return by_day
 
 
 # ---------- DB ----------
-def ensure_db_ok_or_rebuild():
-    if not os.path.exists(DB_PATH):
-        return
+def load_meta() -> dict:
+    try:
+        with open(META_PATH, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta if isinstance(meta, dict) else {}
+    except Exception:
+        return {}
 
+def save_meta(meta: dict):
+    tmp = META_PATH + ".tmp"
     try:
-        conn = sqlite3.connect(DB_PATH)
-        row = conn.execute("PRAGMA integrity_check;").fetchone()
-        conn.close()
-        if row and row[0] == "ok":
-            return
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, META_PATH)
     except Exception:
         pass
 
+def db_integrity_ok() -> bool:
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            row = conn.execute("PRAGMA integrity_check;").fetchone()
+        finally:
+            conn.close()
+        return bool(row) and row[0] == "ok"
+    except Exception:
+        return False
+
+def integrity_check_due() -> bool:
+    if not os.path.exists(DB_PATH):
+        return False
+    try:
+        last = datetime.fromisoformat(load_meta()["last_integrity_check"])
+    except Exception:
+        return True
+    return datetime.now() - last > INTEGRITY_CHECK_INTERVAL
+
+def run_integrity_check() -> bool:
+    # полная проверка на отдельном соединении; при ошибке база
+    # пересобирается на следующем запуске (ensure_db_ok_or_rebuild)
+    ok = db_integrity_ok()
+    meta = load_meta()
+    if ok:
+        meta["last_integrity_check"] = datetime.now().isoformat(timespec="seconds")
+        meta.pop("rebuild_pending", None)
+    else:
+        meta["rebuild_pending"] = True
+    save_meta(meta)
+    return ok
+
+def ensure_db_ok_or_rebuild():
+    if not os.path.exists(DB_PATH):
+        return
+
+    if run_integrity_check():
+        return
+
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     bad_path = os.path.join(DATA_DIR, f"questodo_CORRUPTED_{ts}.db")
     try:
@@ -84,123 +177,201 @@ def ensure_db_ok_or_rebuild():
         except Exception:
             pass
 
+    meta = load_meta()
+    meta.pop("rebuild_pending", None)
+    save_meta(meta)
+
+_WRITE_CONN: sqlite3.Connection | None = None
+_READ_CONN: sqlite3.Connection | None = None
+_DB_LOCK = threading.RLock()
+_READ_LOCK = threading.RLock()
+_ACTIVITIES_GEN = 0  # растёт при каждом изменении таблицы activities
+
+def _apply_cache_pragmas(conn: sqlite3.Connection):
+    conn.execute("PRAGMA cache_size = -65536;")  # 64 MB
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    conn.execute("PRAGMA mmap_size = 268435456;")  # 256 MB
+    conn.execute("PRAGMA busy_timeout = 5000;")
+
 def db_connect():
-    conn = sqlite3.connect(DB_PATH, timeout=10)
+    # isolation_level=None: автокоммит, многошаговые записи открывают BEGIN сами
+    conn = sqlite3.connect(
+        DB_PATH, timeout=10, check_same_thread=False,
+        cached_statements=256, isolation_level=None,
+    )
     conn.execute("PRAGMA foreign_keys = ON;")
     conn.execute("PRAGMA journal_mode = WAL;")
     conn.execute("PRAGMA synchronous = NORMAL;")
+    _apply_cache_pragmas(conn)
     return conn
 
+def db_connect_ro():
+    # читатель: без foreign_keys, в WAL не блокирует писателя
+    conn = sqlite3.connect(
+        Path(DB_PATH).as_uri() + "?mode=ro", uri=True, timeout=10,
+        check_same_thread=False, cached_statements=256, isolation_level=None,
+    )
+    _apply_cache_pragmas(conn)
+    return conn
+
+def get_write_conn() -> sqlite3.Connection:
+    # одно соединение-писатель на весь процесс: pragma выполняются один раз
+    global _WRITE_CONN
+    with _DB_LOCK:
+        if _WRITE_CONN is None:
+            _WRITE_CONN = db_connect()
+            atexit.register(db_close)
+        return _WRITE_CONN
+
+def get_read_conn() -> sqlite3.Connection:
+    # открывается после db_init, когда файл базы уже существует
+    global _READ_CONN
+    with _READ_LOCK:
+        if _READ_CONN is None:
+            _READ_CONN = db_connect_ro()
+            atexit.register(db_close)
+        return _READ_CONN
+
+def db_close():
+    global _WRITE_CONN, _READ_CONN
+    with _READ_LOCK:
+        if _READ_CONN is not None:
+            _READ_CONN.close()
+            _READ_CONN = None
+    with _DB_LOCK:
+        if _WRITE_CONN is not None:
+            _WRITE_CONN.close()
+            _WRITE_CONN = None
+
 def db_init():
-    conn = db_connect()
-    cur = conn.cursor()
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS activities (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE NOT NULL,
-        mandatory INTEGER NOT NULL DEFAULT 0 CHECK(mandatory IN (0,1)),
-        days_mask INTEGER NOT NULL DEFAULT 127,
-        sort_order INTEGER NOT NULL DEFAULT 0
-    );
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS completions (
-        activity_id INTEGER NOT NULL,
-        day TEXT NOT NULL,
-        done INTEGER NOT NULL CHECK(done IN (0,1)),
-        PRIMARY KEY (activity_id, day),
-        FOREIGN KEY (activity_id) REFERENCES activities(id) ON DELETE CASCADE
-    );
-    """)
-
-    cols = [r[1] for r in cur.execute("PRAGMA table_info(activities);").fetchall()]
-    if "mandatory" not in cols:
-        cur.execute("ALTER TABLE activities ADD COLUMN mandatory INTEGER NOT NULL DEFAULT 0 CHECK(mandatory IN (0,1));")
-    if "days_mask" not in cols:
-        cur.execute("ALTER TABLE activities ADD COLUMN days_mask INTEGER NOT NULL DEFAULT 127;")
-    if "sort_order" not in cols:
-        cur.execute("ALTER TABLE activities ADD COLUMN sort_order INTEGER NOT NULL DEFAULT 0;")
-        cur.execute("UPDATE activities SET sort_order = id WHERE sort_order = 0;")
-
-    conn.commit()
-    conn.close()
+    with _DB_LOCK:
+        conn = get_write_conn()
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS activities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            mandatory INTEGER NOT NULL DEFAULT 0 CHECK(mandatory IN (0,1)),
+            days_mask INTEGER NOT NULL DEFAULT 127,
+            sort_order INTEGER NOT NULL DEFAULT 0
+        );
+        """)
+
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS completions (
+            activity_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            done INTEGER NOT NULL CHECK(done IN (0,1)),
+            PRIMARY KEY (activity_id, day),
+            FOREIGN KEY (activity_id) REFERENCES activities(id) ON DELETE CASCADE
+        );
+        """)
+
+        # PK (activity_id, day) не подходит для выборок по диапазону дней
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_completions_day
+        ON completions(day, activity_id) WHERE done = 1;
+        """)
+
+        cols = [r[1] for r in cur.execute("PRAGMA table_info(activities);").fetchall()]
+        if "mandatory" not in cols:
+            cur.execute("ALTER TABLE activities ADD COLUMN mandatory INTEGER NOT NULL DEFAULT 0 CHECK(mandatory IN (0,1));")
+        if "days_mask" not in cols:
+            cur.execute("ALTER TABLE activities ADD COLUMN days_mask INTEGER NOT NULL DEFAULT 127;")
+        if "sort_order" not in cols:
+            cur.execute("ALTER TABLE activities ADD COLUMN sort_order INTEGER NOT NULL DEFAULT 0;")
+            cur.execute("UPDATE activities SET sort_order = id WHERE sort_order = 0;")
+
+        conn.commit()
+
+def _bump_activities_gen():
+    global _ACTIVITIES_GEN
+    _ACTIVITIES_GEN += 1
+
+def db_activities_gen() -> int:
+    return _ACTIVITIES_GEN
 
 def db_list_activities():
-    conn = db_connect()
-    rows = conn.execute(
-        "SELECT id, name, mandatory, days_mask FROM activities ORDER BY sort_order ASC, name COLLATE NOCASE"
-    ).fetchall()
-    conn.close()
-    return rows
+    with _READ_LOCK:
+        return get_read_conn().execute(
+            "SELECT id, name, mandatory, days_mask FROM activities ORDER BY sort_order ASC, name COLLATE NOCASE"
+        ).fetchall()
+
+def db_list_activities_soa() -> ActivitiesSoA:
+    return ActivitiesSoA.from_rows(db_list_activities())
 
 def db_count_activities() -> int:
-    conn = db_connect()
-    n = conn.execute("SELECT COUNT(*) FROM activities").fetchone()[0]
-    conn.close()
+    with _READ_LOCK:
+        n = get_read_conn().execute("SELECT COUNT(*) FROM activities").fetchone()[0]
     return int(n)
 
-def db_any_mandatory_exists() -> bool:
-    conn = db_connect()
-    row = conn.execute("SELECT 1 FROM activities WHERE mandatory=1 LIMIT 1").fetchone()
-    conn.close()
-    return row is not None
-
 def db_add_activity(name: str) -> tuple[bool, str]:
     name = (name or "").strip()
     if not name:
         return False, "empty"
 
-    conn = db_connect()
-    try:
-        max_order = conn.execute("SELECT COALESCE(MAX(sort_order), 0) FROM activities;").fetchone()[0]
-        conn.execute(
-            "INSERT INTO activities(name, mandatory, days_mask, sort_order) VALUES(?, 0, ?, ?)",
-            (name, full_week_mask(), int(max_order) + 1)
-        )
-        conn.commit()
-        return True, ""
-    except sqlite3.IntegrityError:
-        return False, "exists"
-    finally:
-        conn.close()
+    with _DB_LOCK:
+        conn = get_write_conn()
+        try:
+            max_order = conn.execute("SELECT COALESCE(MAX(sort_order), 0) FROM activities;").fetchone()[0]
+            conn.execute(
+                "INSERT INTO activities(name, mandatory, days_mask, sort_order) VALUES(?, 0, ?, ?)",
+                (name, full_week_mask(), int(max_order) + 1)
+            )
+            conn.commit()
+            _bump_activities_gen()
+            return True, ""
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False, "exists"
 
 def db_rename_activity(activity_id: int, new_name: str) -> tuple[bool, str]:
     new_name = (new_name or "").strip()
     if not new_name:
         return False, "empty"
-    conn = db_connect()
-    try:
-        conn.execute("UPDATE activities SET name=? WHERE id=?", (new_name, int(activity_id)))
-        conn.commit()
-        return True, ""
-    except sqlite3.IntegrityError:
-        return False, "exists"
-    finally:
-        conn.close()
+    with _DB_LOCK:
+        conn = get_write_conn()
+        try:
+            conn.execute("UPDATE activities SET name=? WHERE id=?", (new_name, int(activity_id)))
+            conn.commit()
+            _bump_activities_gen()
+            return True, ""
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False, "exists"
 
 def db_set_sort_orders(ordered_ids: list[int]):
-    conn = db_connect()
-    try:
-        for i, aid in enumerate(ordered_ids, start=1):
-            conn.execute("UPDATE activities SET sort_order=? WHERE id=?", (i, int(aid)))
-        conn.commit()
-    finally:
-        conn.close()
+    with _DB_LOCK:
+        conn = get_write_conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE activities SET sort_order=? WHERE id=?",
+                [(i, int(aid)) for i, aid in enumerate(ordered_ids, start=1)]
+            )
+            conn.commit()
+            _bump_activities_gen()
+        except Exception:
+            conn.rollback()
+            raise
 
 def db_delete_activity(activity_id: int):
-    conn = db_connect()
-    conn.execute("DELETE FROM activities WHERE id=?", (activity_id,))
-    conn.commit()
-    conn.close()
+    with _DB_LOCK:
+        conn = get_write_conn()
+        conn.execute("DELETE FROM activities WHERE id=?", (activity_id,))
+        conn.commit()
+        _bump_activities_gen()
 
 def db_clear_all():
-    conn = db_connect()
-    conn.execute("DELETE FROM completions;")
-    conn.execute("DELETE FROM activities;")
-    conn.commit()
-    conn.close()
+    with _DB_LOCK:
+        conn = get_write_conn()
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM completions;")
+        conn.execute("DELETE FROM activities;")
+        conn.commit()
+        _bump_activities_gen()
 
 def db_update_activity(activity_id: int, *, mandatory=None, days_mask=None):
     sets, vals = [], []
@@ -214,59 +385,98 @@ def db_update_activity(activity_id: int, *, mandatory=None, days_mask=None):
         return
     vals.append(int(activity_id))
 
-    conn = db_connect()
-    conn.execute(f"UPDATE activities SET {', '.join(sets)} WHERE id=?", vals)
-    conn.commit()
-    conn.close()
-
-def db_get_done(activity_id: int, day_iso: str) -> int:
-    conn = db_connect()
-    row = conn.execute(
-        "SELECT done FROM completions WHERE activity_id=? AND day=?",
-        (activity_id, day_iso)
-    ).fetchone()
-    conn.close()
-    return int(row[0]) if row else 0
+    with _DB_LOCK:
+        conn = get_write_conn()
+        conn.execute(f"UPDATE activities SET {', '.join(sets)} WHERE id=?", vals)
+        conn.commit()
+        _bump_activities_gen()
 
 def db_set_done(activity_id: int, day_iso: str, done: int):
-    conn = db_connect()
-    conn.execute("""
-    INSERT INTO completions(activity_id, day, done)
-    VALUES(?, ?, ?)
-    ON CONFLICT(activity_id, day) DO UPDATE SET done=excluded.done
-    """, (int(activity_id), day_iso, int(done)))
-    conn.commit()
-    conn.close()
-
-def db_bulk_done_map(start_iso: str, end_iso: str) -> dict[tuple[int, str], int]:
-    conn = db_connect()
-    rows = conn.execute("""
-        SELECT activity_id, day, done
-        FROM completions
-        WHERE day >= ? AND day <= ?
-    """, (start_iso, end_iso)).fetchall()
-    conn.close()
-    return {(int(a), str(d)): int(done) for a, d, done in rows}
+    with _DB_LOCK:
+        conn = get_write_conn()
+        conn.execute("""
+        INSERT INTO completions(activity_id, day, done)
+        VALUES(?, ?, ?)
+        ON CONFLICT(activity_id, day) DO UPDATE SET done=excluded.done
+        """, (int(activity_id), day_iso, int(done)))
+        conn.commit()
+
+def db_set_done_many(rows: list[tuple[int, str, int]]):
+    # rows: (activity_id, day_iso, done) — одной транзакцией
+    if not rows:
+        return
+    with _DB_LOCK:
+        conn = get_write_conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany("""
+            INSERT INTO completions(activity_id, day, done)
+            VALUES(?, ?, ?)
+            ON CONFLICT(activity_id, day) DO UPDATE SET done=excluded.done
+            """, [(int(a), d, int(v)) for a, d, v in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def db_count_done_planned(start_iso: str, end_iso: str) -> int:
+    # отметки в диапазоне, попадающие в план активности; start_iso — понедельник
+    with _READ_LOCK:
+        n = get_read_conn().execute("""
+            SELECT COUNT(*)
+            FROM completions c
+            JOIN activities a ON a.id = c.activity_id
+            WHERE c.day >= ? AND c.day <= ? AND c.done = 1
+              AND (a.days_mask >> (CAST(julianday(c.day) - julianday(?) AS INTEGER) % 7)) & 1 = 1
+        """, (start_iso, end_iso, start_iso)).fetchone()[0]
+    return int(n)
 
+def db_done_set(start_iso: str, end_iso: str) -> set[tuple[int, str]]:
+    # только выполненные отметки: (activity_id, day)
+    with _READ_LOCK:
+        rows = get_read_conn().execute("""
+            SELECT activity_id, day
+            FROM completions
+            WHERE day >= ? AND day <= ? AND done = 1
+        """, (start_iso, end_iso)).fetchall()
+    return {(int(a), str(d)) for a, d in rows}
+
+def db_done_keys(start_iso: str, end_iso: str) -> set[int]:
+    # выполненные отметки в пределах одной недели: activity_id << 3 | день недели (Пн=0)
+    with _READ_LOCK:
+        rows = get_read_conn().execute("""
+            SELECT (activity_id << 3) | ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7)
+            FROM completions
+            WHERE day >= ? AND day <= ? AND done = 1
+        """, (start_iso, end_iso)).fetchall()
+    return {int(k) for (k,) in rows}
+
+def db_done_weekday_counts(start_iso: str, end_iso: str) -> dict[int, int]:
+    # число выполненных отметок по ключу activity_id << 3 | день недели (Пн=0)
+    with _READ_LOCK:
+        rows = get_read_conn().execute("""
+            SELECT (activity_id << 3) | ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) AS k, COUNT(*)
+            FROM completions
+            WHERE day >= ? AND day <= ? AND done = 1
+            GROUP BY k
+        """, (start_iso, end_iso)).fetchall()
+    return {int(k): int(n) for k, n in rows}
 
-# ---------- streak ----------
-def day_is_success_for_streak(day_: date) -> bool:
-    activities = db_list_activities()
-    day_idx = day_.weekday()
-    required = []
-    for a_id, _, mandatory, days_mask in activities:
-        if int(mandatory) == 1 and mask_has_day(int(days_mask), day_idx):
-            required.append(int(a_id))
-
-    if not required:
-        return True
 
-    iso = day_.isoformat()
-    return all(db_get_done(a_id, iso) == 1 for a_id in required)
+# ---------- streak ----------
+STREAK_WINDOW_DAYS = 400
 
-def calc_streak_upto(today: date, allowed_misses_per_week: int = 1) -> int:
-    if not db_any_mandatory_exists():
+def calc_streak_upto(today: date, allowed_misses_per_week: int = 1,
+                     acts: ActivitiesSoA | None = None) -> int:
+    if acts is None:
+        acts = db_list_activities_soa()
+    if not acts.has_mandatory():
         return 0
+    required_by_day = ids_by_weekday(acts, mandatory_only=True)
+
+    # отметки грузим окнами по STREAK_WINDOW_DAYS, а не запросом на каждый день
+    done_set: set[tuple[int, str]] = set()
+    loaded_from = today + timedelta(days=1)
 
     streak = 0
     d = today
@@ -274,12 +484,17 @@ def calc_streak_upto(today: date, allowed_misses_per_week: int = 1) -> int:
     misses = 0
 
     while True:
+        if d < loaded_from:
+            loaded_from = d - timedelta(days=STREAK_WINDOW_DAYS - 1)
+            done_set |= db_done_set(loaded_from.isoformat(), d.isoformat())
+
         w = monday(d)
         if w != current_week:
             current_week = w
             misses = 0
 
-        ok = day_is_success_for_streak(d)
+        iso = d.isoformat()
+        ok = all((a_id, iso) in done_set for a_id in required_by_day[d.weekday()])
         if ok:
             streak += 1
         else:
@@ -537,6 +752,27 @@ def apply_palette(app: QApplication, dark: bool):
     app.setPalette(pal)
 
 
+# ---------- table helpers ----------
+@contextmanager
+def batch_table_update(*tables):
+    # массовое заполнение QTableWidget: без перерисовок, сигналов и сортировки
+    states = []
+    for t in tables:
+        states.append((t, t.isSortingEnabled(), t.signalsBlocked()))
+        t.setUpdatesEnabled(False)
+        t.blockSignals(True)
+        t.setSortingEnabled(False)
+        t.horizontalHeader().setUpdatesEnabled(False)
+    try:
+        yield
+    finally:
+        for t, sorting, blocked in reversed(states):
+            t.horizontalHeader().setUpdatesEnabled(True)
+            t.setSortingEnabled(sorting)
+            t.blockSignals(blocked)
+            t.setUpdatesEnabled(True)
+
+
 # ---------- dialogs ----------
 class TaskSettingsDialog(QDialog):
     def __init__(self, task_name: str, mandatory: int, days_mask: int, parent=None):
@@ -609,14 +845,123 @@ class ActivitiesList(QListWidget):
         self.on_reorder(ids)
 
 
+# ---------- week table delegate ----------
+class CheckDelegate(QStyledItemDelegate):
+    # чекбокс дня рисуется делегатом вместо QWidget+QCheckBox в каждой ячейке
+    DONE_ROLE = Qt.UserRole
+    PLANNED_ROLE = Qt.UserRole + 1
+
+    # один сигнал на все ячейки: (row, col), без замыканий на каждую ячейку
+    clicked = Signal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # фон дней (сегодня/выбранный день) и цвет hover задаёт WeekTab
+        self.day_bgs = [QColor(0, 0, 0, 0)] * 7
+        self.hover_bg = QColor(0, 0, 0, 0)
+        # невидимый QCheckBox — чтобы к индикатору применялись правила QCheckBox::indicator из QSS
+        self._cb_proxy = QCheckBox(parent)
+        self._cb_proxy.hide()
+
+    def paint(self, painter, option, index):
+        # фон дня/hover рисуем сами — у ячеек нет собственного фона в item
+        planned = index.data(self.PLANNED_ROLE)
+        if planned and option.state & QStyle.State_MouseOver:
+            bg = self.hover_bg
+        else:
+            bg = self.day_bgs[index.column() - 1]
+        if bg.alpha():
+            painter.fillRect(option.rect, bg)
+        # поверх — BackgroundRole (вспышка после клика) от базового делегата
+        super().paint(painter, option, index)
+
+        style = self._cb_proxy.style()
+        w = style.pixelMetric(QStyle.PM_IndicatorWidth, None, self._cb_proxy)
+        h = style.pixelMetric(QStyle.PM_IndicatorHeight, None, self._cb_proxy)
+
+        rect = QRect(0, 0, w, h)
+        rect.moveCenter(option.rect.center())
+        opt = QStyleOptionButton()
+        opt.rect = rect
+        opt.state = QStyle.State_On if index.data(self.DONE_ROLE) else QStyle.State_Off
+        if planned:
+            opt.state |= QStyle.State_Enabled
+            if option.state & QStyle.State_MouseOver:
+                opt.state |= QStyle.State_MouseOver
+        style.drawPrimitive(QStyle.PE_IndicatorCheckBox, opt, painter, self._cb_proxy)
+
+    def editorEvent(self, event, model, option, index):
+        # вид передаёт release только если press был по этой же ячейке
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            self.clicked.emit(index.row(), index.column())
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+# ---------- background tasks ----------
+class IntegrityCheckTask(QRunnable):
+    def run(self):
+        run_integrity_check()
+
+
+class StreakSignals(QObject):
+    ready = Signal(int)
+
+
+class StreakTask(QRunnable):
+    def __init__(self, acts: ActivitiesSoA, signals: StreakSignals):
+        super().__init__()
+        self.acts = acts
+        self.signals = signals
+
+    def run(self):
+        try:
+            s = calc_streak_upto(date.today(), allowed_misses_per_week=1, acts=self.acts)
+        except Exception:
+            s = -1
+        self.signals.ready.emit(s)
+
+
 # ---------- UI tabs ----------
 class   WeekTab(QWidget):
+    _CLR_NONE = QColor(0, 0, 0, 0)
+    _CLR_TODAY = QColor(34, 197, 94, 18)
+    _CLR_SEL = QColor(34, 197, 94, 30)
+    _CLR_HOVER = QColor(34, 197, 94, 28)
+    _CLR_HDR_TODAY = QColor(34, 197, 94, 40)
+    _CLR_HDR_SEL = QColor(34, 197, 94, 70)
+    _CLR_PULSE_START = QColor(34, 197, 94, 120)
+    _CLR_PULSE_END = QColor(34, 197, 94, 0)
+
     def __init__(self, on_db_changed):
         super().__init__()
         self.on_db_changed = on_db_changed
         self.week_start = monday(date.today())
         self._activity_rows: dict[int, int] = {}
+        self._activities_cache = None
+        self._activities_soa = None
+        self._activities_gen = -1
+        # состояние отрисованных строк: aid -> (имя, обязательная, маска, отметки недели)
+        self._row_state: dict[int, tuple[str, int, int, tuple[int, ...]]] = {}
+        self._row_ids: tuple[int, ...] | None = None
+        self._streak_busy = False
+        self._streak_dirty = False
+        self._streak_signals = StreakSignals(self)
+        self._streak_signals.ready.connect(self._on_streak_ready)
+        # отложенная запись отметок: серия кликов уходит в БД одной транзакцией
+        self._pending: dict[tuple[int, str], int] = {}
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(100)
+        self._flush_timer.timeout.connect(self._on_flush_timer)
+        # серия и прогресс пересчитываются один раз после серии изменений
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(100)
+        self._refresh_timer.timeout.connect(self._do_refresh)
         self.selected_day_idx = None
+        self._today_idx = None
+        self._base_bgs = [self._CLR_NONE] * 7
 
         root = QHBoxLayout(self)
         root.setSpacing(12)
@@ -642,7 +987,13 @@ class   WeekTab(QWidget):
 
         self.search = QLineEdit()
         self.search.setPlaceholderText("🔎 Поиск активности...")
-        self.search.textChanged.connect(self.apply_filter)
+        self._name_lower: list[str] = []
+        self._visible_set: set[int] = set()
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(80)
+        self._filter_timer.timeout.connect(self.apply_filter)
+        self.search.textChanged.connect(self._filter_timer.start)
         box_lay.addWidget(self.search)
 
         self.list_acts = ActivitiesList(on_reorder=self.save_reorder)
@@ -741,15 +1092,22 @@ class   WeekTab(QWidget):
         self.table = QTableWidget()
         self.table.setMouseTracking(True)
         self.table.viewport().setMouseTracking(True)
+        self.table.viewport().setAttribute(Qt.WA_Hover)
         self.table.viewport().installEventFilter(self)
-        self._hover_cell = (-1, -1)
+        # подсветку рисует CheckDelegate по State_MouseOver; курсор — по смене ячейки
+        self.table.entered.connect(self._on_cell_entered)
+        self.table.viewportEntered.connect(self.table.viewport().unsetCursor)
         self.table.setColumnCount(8)
         self.table.setHorizontalHeaderLabels(["Активность"] + DAYS)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.verticalHeader().setVisible(False)
         self.table.setAlternatingRowColors(False)
         self.table.horizontalHeader().sectionClicked.connect(self.on_header_clicked)
-        self.table.cellClicked.connect(self.on_cell_clicked)
+        self._check_delegate = CheckDelegate(self.table)
+        self._check_delegate.clicked.connect(self.on_cell_clicked)
+        self._check_delegate.hover_bg = self._CLR_HOVER
+        for i in range(7):
+            self.table.setItemDelegateForColumn(i + 1, self._check_delegate)
 
         right.addWidget(self.table, 1)
 
@@ -761,6 +1119,19 @@ class   WeekTab(QWidget):
         self.load_data()
         self._undo_stack = []  # (activity_id, day_iso, prev_value)
 
+    def activities(self):
+        # список активностей перечитывается только после изменений в БД
+        gen = db_activities_gen()
+        if self._activities_cache is None or self._activities_gen != gen:
+            self._activities_cache = db_list_activities()
+            self._activities_soa = ActivitiesSoA.from_rows(self._activities_cache)
+            self._activities_gen = gen
+        return self._activities_cache
+
+    def activities_soa(self) -> ActivitiesSoA:
+        self.activities()
+        return self._activities_soa
+
     def toggle_current_cell(self):
         r = self.table.currentRow()
         c = self.table.currentColumn()
@@ -772,18 +1143,36 @@ class   WeekTab(QWidget):
         if not self._undo_stack:
             return
         aid, day_iso, prev = self._undo_stack.pop()
+        self.flush_pending()
         db_set_done(aid, day_iso, prev)
 
         self.load_data()
         self.on_db_changed()
 
     def on_done_toggled(self, activity_id: int, day_iso: str, checked: bool, row: int, col: int):
-        db_set_done(activity_id, day_iso, 1 if checked else 0)
-        self.refresh_streak()
-        self.update_week_progress()
-        self.on_db_changed()
+        self._pending[(int(activity_id), day_iso)] = 1 if checked else 0
+        self._flush_timer.start()
         self.animate_cell_pulse(row, col)
 
+    def flush_pending(self) -> bool:
+        self._flush_timer.stop()
+        if not self._pending:
+            return False
+        rows = [(aid, day_iso, done) for (aid, day_iso), done in self._pending.items()]
+        self._pending.clear()
+        db_set_done_many(rows)
+        return True
+
+    def _on_flush_timer(self):
+        # сам таймер записи уже дебаунсит клики, поэтому пересчёт — сразу
+        if self.flush_pending():
+            self._refresh_timer.stop()
+            self._do_refresh()
+            self.on_db_changed()
+
+    def _do_refresh(self):
+        self.refresh_streak()
+        self.update_week_progress()
 
     def prev_week(self):
         self.week_start -= timedelta(days=7)
@@ -794,23 +1183,64 @@ class   WeekTab(QWidget):
         self.load_data()
 
     def refresh_streak(self):
-        s = calc_streak_upto(date.today(), allowed_misses_per_week=1)
-        if not db_any_mandatory_exists():
+        # серия считается в пуле потоков; пока идёт расчёт, виден прошлый результат
+        acts = self.activities_soa()
+        if not acts.has_mandatory():
+            self._streak_dirty = False
             self.streak_label.setText("🔥 Серия: — (нет обязательных)")
-        else:
+            return
+        if self._streak_busy:
+            self._streak_dirty = True
+            return
+        if not self.streak_label.text():
+            self.streak_label.setText("🔥 Серия: …")
+        self._streak_busy = True
+        QThreadPool.globalInstance().start(StreakTask(acts, self._streak_signals))
+
+    def _on_streak_ready(self, s: int):
+        self._streak_busy = False
+        if self._streak_dirty:
+            self._streak_dirty = False
+            self.refresh_streak()
+            return
+        if s >= 0 and self.activities_soa().has_mandatory():
             self.streak_label.setText(f"🔥 Серия: {s} дн.")
 
     def apply_filter(self):
+        # трогаем только элементы, у которых видимость изменилась
         q = (self.search.text() or "").strip().lower()
-        for i in range(self.list_acts.count()):
+        if q:
+            new_visible = {i for i, n in enumerate(self._name_lower) if q in n}
+        else:
+            new_visible = set(range(len(self._name_lower)))
+        for i in new_visible ^ self._visible_set:
             it = self.list_acts.item(i)
-            name = it.text().replace("⭐ ", "").lower()
-            it.setHidden(bool(q) and q not in name)
+            if it:
+                it.setHidden(i not in new_visible)
+        self._visible_set = new_visible
 
     def save_reorder(self, ordered_ids: list[int]):
+        # список уже переставлен виджетом — синхронизируем БД и порядок строк таблицы;
+        # порядок не влияет на серию, прогресс и статистику — их не пересчитываем
         db_set_sort_orders(ordered_ids)
-        self.load_data()
-        self.on_db_changed()
+        self._name_lower = [
+            str(self.list_acts.item(i).data(Qt.UserRole + 10) or "").lower()
+            for i in range(self.list_acts.count())
+        ]
+        self._visible_set = {i for i in range(self.list_acts.count()) if not self.list_acts.item(i).isHidden()}
+        self._apply_row_order(ordered_ids)
+        self._row_ids = tuple(int(aid) for aid in ordered_ids)
+
+    def _apply_row_order(self, ordered_ids: list[int]):
+        # строки не пересоздаём, а переставляем секции вертикального заголовка
+        header = self.table.verticalHeader()
+        for visual, aid in enumerate(ordered_ids):
+            row = self._activity_rows.get(int(aid))
+            if row is None:
+                continue
+            cur = header.visualIndex(row)
+            if cur != visual:
+                header.moveSection(cur, visual)
 
     def on_item_renamed(self, item: QListWidgetItem):
         aid = int(item.data(Qt.UserRole))
@@ -835,8 +1265,24 @@ class   WeekTab(QWidget):
             self.list_acts.blockSignals(False)
             return
 
+        mand = int(item.data(Qt.UserRole + 1))
+        label = f"⭐ {new_text}" if mand == 1 else new_text
+        self.list_acts.blockSignals(True)
         item.setData(Qt.UserRole + 10, new_text)
-        self.load_data()
+        item.setText(label)
+        self.list_acts.blockSignals(False)
+
+        idx = self.list_acts.row(item)
+        if 0 <= idx < len(self._name_lower):
+            self._name_lower[idx] = new_text.lower()
+            self.apply_filter()
+        row = self._activity_rows.get(aid)
+        name_item = self.table.item(row, 0) if row is not None else None
+        if name_item:
+            name_item.setText(label)
+        st = self._row_state.get(aid)
+        if st is not None:
+            self._row_state[aid] = (new_text,) + st[1:]
         self.on_db_changed()
 
     def on_header_clicked(self, section: int):
@@ -855,14 +1301,13 @@ class   WeekTab(QWidget):
             QMessageBox.information(self, "День не выбран", "Кликни по заголовку дня (Пн..Вс) в таблице.")
             return
 
-        activities = db_list_activities()
-        day = self.week_start + timedelta(days=self.selected_day_idx)
-        day_iso = day.isoformat()
+        self.flush_pending()
+        acts = self.activities_soa()
+        day_iso = self._iso_days[self.selected_day_idx]
 
-        for a_id, _, _, days_mask in activities:
-            planned = mask_has_day(int(days_mask), self.selected_day_idx)
-            if planned:
-                db_set_done(int(a_id), day_iso, 1 if value else 0)
+        done = 1 if value else 0
+        rows = [(a_id, day_iso, done) for a_id in ids_by_weekday(acts)[self.selected_day_idx]]
+        db_set_done_many(rows)
 
         self.load_data()
         self.on_db_changed()
@@ -880,23 +1325,17 @@ class   WeekTab(QWidget):
             it.setFlags(it.flags() | Qt.ItemIsEditable)
             self.list_acts.addItem(it)
         self.list_acts.blockSignals(False)
+        self._name_lower = [name.lower() for _, name, _, _ in activities]
+        self._visible_set = set(range(len(activities)))
         self.apply_filter()
 
-    def update_week_progress(self):
-        activities = db_list_activities()
-        start_iso = self.week_start.isoformat()
-        end_iso = (self.week_start + timedelta(days=6)).isoformat()
-        done_map = db_bulk_done_map(start_iso, end_iso)
+    def update_week_progress(self, acts: ActivitiesSoA | None = None):
+        if acts is None:
+            acts = self.activities_soa()
+        start_iso, end_iso = self._iso_days[0], self._iso_days[6]
 
-        planned_total = 0
-        done_total = 0
-        for a_id, _, _, days_mask in activities:
-            for i in range(7):
-                if mask_has_day(int(days_mask), i):
-                    planned_total += 1
-                    d_iso = (self.week_start + timedelta(days=i)).isoformat()
-                    if done_map.get((int(a_id), d_iso), 0) == 1:
-                        done_total += 1
+        planned_total = sum(bin(m).count("1") for m in acts.masks)
+        done_total = db_count_done_planned(start_iso, end_iso)
 
         if planned_total <= 0:
             self.progress.setValue(0)
@@ -908,152 +1347,213 @@ class   WeekTab(QWidget):
         self.progress.setFormat(f"Прогресс недели: {pct}%  ({done_total}/{planned_total})")
 
     def load_data(self):
-        self.week_title.setText(f"Неделя: {week_label(self.week_start)}")
-        self.count_label.setText(f"Активностей: {db_count_activities()}")
+        if self.flush_pending():
+            self.on_db_changed()
 
-        activities = db_list_activities()
-        self.load_activities_list(activities)
+        self._iso_days = [(self.week_start + timedelta(days=i)).isoformat() for i in range(7)]
+        offset = (date.today() - self.week_start).days
+        self._today_idx = offset if 0 <= offset <= 6 else None
 
-        start_iso = self.week_start.isoformat()
-        end_iso = (self.week_start + timedelta(days=6)).isoformat()
-        done_map = db_bulk_done_map(start_iso, end_iso)
+        self.week_title.setText(f"Неделя: {week_label(self.week_start)}")
+        self.count_label.setText(f"Активностей: {db_count_activities()}")
 
-        today = date.today()
-        today_idx = None
-        if self.week_start <= today <= (self.week_start + timedelta(days=6)):
-            today_idx = (today - self.week_start).days
-
-        self.table.setHorizontalHeaderItem(0, QTableWidgetItem("Активность"))
-        for i, dn in enumerate(DAYS, start=1):
-            hi = QTableWidgetItem(dn)
-            hi.setTextAlignment(Qt.AlignCenter)
-            if today_idx is not None and (i - 1) == today_idx:
-                hi.setBackground(QColor(34, 197, 94, 40))
-            if self.selected_day_idx is not None and (i - 1) == self.selected_day_idx:
-                hi.setBackground(QColor(34, 197, 94, 70))
-            self.table.setHorizontalHeaderItem(i, hi)
-
-        self._activity_rows.clear()
-        self.table.setRowCount(len(activities))
+        # сверяем с прошлым состоянием и трогаем только изменившиеся строки/ячейки
+        activities = self.activities()
+        with batch_table_update(self.table):
+            rebuilt = self._sync_rows(activities)
+            self._fill_cells(activities, force=rebuilt)
+
+        self._refresh_timer.start()
+
+    def _sync_rows(self, activities) -> bool:
+        # строки пересоздаются только при изменении состава/порядка активностей
+        ids = tuple(int(a[0]) for a in activities)
+        if ids != self._row_ids:
+            self.load_activities_list(activities)
+            self._build_rows(activities)
+            self._row_ids = ids
+            return True
+
+        state = self._row_state
+        renamed = False
+        for idx, (a_id, name, mandatory, days_mask) in enumerate(activities):
+            aid, mand, m = int(a_id), int(mandatory), int(days_mask)
+            prev = state[aid]
+            if prev[:3] != (name, mand, m):
+                renamed = renamed or prev[0] != name
+                self._update_row(idx, aid, name, mand, m, prev)
+        if renamed:
+            self.apply_filter()  # новое имя может не совпадать с текущим поиском
+        return False
+
+    def _update_row(self, idx: int, aid: int, name: str, mand: int, m: int, prev):
+        label = f"⭐ {name}" if mand == 1 else name
+
+        it = self.list_acts.item(idx)
+        if it:
+            self.list_acts.blockSignals(True)
+            it.setText(label)
+            it.setData(Qt.UserRole + 1, mand)
+            it.setData(Qt.UserRole + 2, m)
+            it.setData(Qt.UserRole + 10, name)
+            self.list_acts.blockSignals(False)
+        if idx < len(self._name_lower):
+            self._name_lower[idx] = name.lower()
+
+        row = self._activity_rows[aid]
+        item = self.table.item(row, 0)
+        if item:
+            item.setText(label)
+            item.setData(Qt.UserRole + 1, mand)
+            item.setData(Qt.UserRole + 2, m)
+        if m != prev[2]:
+            planned = _MASK_TABLE[m & 127]
+            for i in range(7):
+                day_item = self.table.item(row, i + 1)
+                if day_item:
+                    day_item.setData(CheckDelegate.PLANNED_ROLE, planned[i])
+
+        self._row_state[aid] = (name, mand, m, prev[3])
+
+    def _build_rows(self, activities):
+        table = self.table
+        activity_rows = self._activity_rows
+        row_state = self._row_state
+        activity_rows.clear()
+        row_state.clear()
+        # вспышки держат ссылки на ячейки, которые сейчас будут удалены
+        for anim in self.findChildren(QVariantAnimation, "cell_pulse"):
+            anim.stop()
+            anim.deleteLater()
+        if table.verticalHeader().sectionsMoved():
+            table.setRowCount(0)  # сбрасываем перестановки от _apply_row_order
+        table.setRowCount(len(activities))
+
+        # локальные ссылки — внутренний цикл выполняется 7×N раз
+        set_item = table.setItem
+        item_cls = QTableWidgetItem
+        user_role = Qt.UserRole
+        enabled = Qt.ItemIsEnabled
+        planned_role = CheckDelegate.PLANNED_ROLE
+        done_role = CheckDelegate.DONE_ROLE
+        no_done = (0,) * 7
 
         for row, (a_id, name, mandatory, days_mask) in enumerate(activities):
-            self._activity_rows[int(a_id)] = row
-
-            item = QTableWidgetItem(name)
-            item.setData(Qt.UserRole, int(a_id))
-            item.setData(Qt.UserRole + 1, int(mandatory))
-            item.setData(Qt.UserRole + 2, int(days_mask))
+            aid, mand, m = int(a_id), int(mandatory), int(days_mask)
+            activity_rows[aid] = row
+            row_state[aid] = (name, mand, m, no_done)
+
+            item = item_cls(name)
+            item.setData(user_role, aid)
+            item.setData(user_role + 1, mand)
+            item.setData(user_role + 2, m)
             item.setFlags(item.flags() ^ Qt.ItemIsEditable)
-            if int(mandatory) == 1:
+            if mand == 1:
                 item.setText(f"⭐ {name}")
-            self.table.setItem(row, 0, item)
+            set_item(row, 0, item)
 
+            planned = _MASK_TABLE[m & 127]
             for i in range(7):
-                day = self.week_start + timedelta(days=i)
-                day_iso = day.isoformat()
-                planned = mask_has_day(int(days_mask), i)
-
-                # --- фон ячейки (нужен для hover/сегодня/выбранный день) ---
-                bg_item = QTableWidgetItem("")
-                bg_item.setFlags(Qt.ItemIsEnabled)
-                if today_idx is not None and i == today_idx:
-                    bg_item.setBackground(QColor(34, 197, 94, 18))
-                if self.selected_day_idx is not None and i == self.selected_day_idx:
-                    bg_item.setBackground(QColor(34, 197, 94, 30))
-                self.table.setItem(row, i + 1, bg_item)
-
-                # --- чекбокс ---
-                cb = QCheckBox()
-                cb.setCursor(Qt.PointingHandCursor)
-                cb.setEnabled(planned)
-                cb.setChecked(done_map.get((int(a_id), day_iso), 0) == 1)
-
-                cb.toggled.connect(
-                    lambda checked, aid=int(a_id), d=day_iso, r=row, c=i + 1:
-                    self.on_done_toggled(aid, d, checked, r, c)
-                )
-
-                cell = QWidget()
-                cell_lay = QHBoxLayout(cell)
-                cell_lay.setContentsMargins(0, 0, 0, 0)
-                cell_lay.setAlignment(Qt.AlignCenter)
-                cell_lay.addWidget(cb)
-
-                self.table.setCellWidget(row, i + 1, cell)
-
-        self.refresh_streak()
-        self.update_week_progress()
+                # --- ячейка дня: только состояние для CheckDelegate, фон рисует он сам ---
+                day_item = item_cls("")
+                day_item.setFlags(enabled)
+                day_item.setData(planned_role, planned[i])
+                day_item.setData(done_role, 0)
+                set_item(row, i + 1, day_item)
+
+    def _fill_cells(self, activities, force: bool = False):
+        iso_days = self._iso_days
+        done_keys = db_done_keys(iso_days[0], iso_days[6])
+        today_idx = self._today_idx
+        sel = self.selected_day_idx
+        table = self.table
+
+        # фон зависит только от сегодняшнего/выбранного дня — перекрашиваем при их смене
+        bgs = [self._compute_base_bg(i) for i in range(7)]
+        bgs_changed = force or bgs != self._base_bgs
+        self._base_bgs = bgs
+
+        if bgs_changed:
+            self._check_delegate.day_bgs = bgs
+            table.viewport().update()
+            table.setHorizontalHeaderItem(0, QTableWidgetItem("Активность"))
+            for i, dn in enumerate(DAYS, start=1):
+                hi = QTableWidgetItem(dn)
+                hi.setTextAlignment(Qt.AlignCenter)
+                if today_idx is not None and (i - 1) == today_idx:
+                    hi.setBackground(self._CLR_HDR_TODAY)
+                if sel is not None and (i - 1) == sel:
+                    hi.setBackground(self._CLR_HDR_SEL)
+                table.setHorizontalHeaderItem(i, hi)
+
+        state = self._row_state
+        activity_rows = self._activity_rows
+        table_item = table.item
+        done_role = CheckDelegate.DONE_ROLE
+        for a_id, _, _, _ in activities:
+            aid = int(a_id)
+            row = activity_rows.get(aid)
+            if row is None:
+                continue
+            prev = state[aid]
+            base = aid << 3
+            done_row = tuple(1 if (base | i) in done_keys else 0 for i in range(7))
+            if done_row == prev[3]:
+                continue
+            for i in range(7):
+                if done_row[i] == prev[3][i]:
+                    continue
+                day_item = table_item(row, i + 1)
+                if day_item:
+                    day_item.setData(done_role, done_row[i])
+            state[aid] = prev[:3] + (done_row,)
 
     def on_cell_clicked(self, row: int, col: int):
         # колонка 0 — название активности
         if col <= 0:
             return
 
-        cell = self.table.cellWidget(row, col)
-        if not cell:
-            return
-
-        cb = cell.findChild(QCheckBox)
-        if not cb or not cb.isEnabled():
+        day_item = self.table.item(row, col)
+        name_item = self.table.item(row, 0)
+        if not day_item or not name_item or not day_item.data(CheckDelegate.PLANNED_ROLE):
             return
 
-        # если кликнули прямо по чекбоксу — он сам переключится
-        if cb.underMouse():
-            return
-
-        cb.setChecked(not cb.isChecked())
+        aid = int(name_item.data(Qt.UserRole))
+        checked = not day_item.data(CheckDelegate.DONE_ROLE)
+        day_item.setData(CheckDelegate.DONE_ROLE, 1 if checked else 0)
+        # клик меняет только одну ячейку — без load_data, но с учётом в _row_state
+        st = self._row_state.get(aid)
+        if st is not None:
+            done_row = list(st[3])
+            done_row[col - 1] = 1 if checked else 0
+            self._row_state[aid] = st[:3] + (tuple(done_row),)
+        self.on_done_toggled(aid, self._iso_days[col - 1], checked, row, col)
 
     def eventFilter(self, obj, event):
         if obj is self.table.viewport():
-            if event.type() == QEvent.MouseMove:
-                idx = self.table.indexAt(event.pos())
-                r, c = idx.row(), idx.column()
-                if (r, c) != self._hover_cell:
-                    old = self._hover_cell
-                    self._hover_cell = (r, c)
-                    self._update_hover_cell(old)
-                    self._update_hover_cell(self._hover_cell)
+            if event.type() == QEvent.HoverMove and QApplication.mouseButtons() != Qt.NoButton:
+                # не даём виду перерисовывать hover-ячейку делегата, пока зажата кнопка
+                return True
             elif event.type() == QEvent.Leave:
-                old = self._hover_cell
-                self._hover_cell = (-1, -1)
-                self._update_hover_cell(old)
+                self.table.viewport().unsetCursor()
         return super().eventFilter(obj, event)
 
-    def _update_hover_cell(self, cell):
-        r, c = cell
-        if r < 0 or c < 1:
-            return
-        item = self.table.item(r, c)
-        if not item:
-            return
-
-        # не подсвечиваем если день не запланирован (чекбокс disabled)
-        w = self.table.cellWidget(r, c)
-        cb = w.findChild(QCheckBox) if w else None
-        if not cb or not cb.isEnabled():
-            return
-
-        if (r, c) == self._hover_cell:
-            item.setBackground(QColor(34, 197, 94, 28))
+    def _on_cell_entered(self, index):
+        # вид сам отслеживает ячейку под курсором; entered приходит только при её смене
+        if index.column() >= 1 and index.data(CheckDelegate.PLANNED_ROLE):
+            self.table.viewport().setCursor(Qt.PointingHandCursor)
         else:
-            item.setBackground(self._base_cell_bg(c - 1))
-
-    def _base_cell_bg(self, day_idx: int) -> QColor:
-        # day_idx: 0..6
-        today = date.today()
-        col = day_idx + 1
-
-        base = QColor(0, 0, 0, 0)
-
+            self.table.viewport().unsetCursor()
 
-        if self.week_start <= today <= (self.week_start + timedelta(days=6)):
-            today_idx = (today - self.week_start).days
-            if day_idx == today_idx:
-                base = QColor(34, 197, 94, 18)
+    def _compute_base_bg(self, day_idx: int) -> QColor:
+        # day_idx: 0..6; результат кэшируется в self._base_bgs при каждом load_data
+        base = self._CLR_NONE
 
+        if self._today_idx is not None and day_idx == self._today_idx:
+            base = self._CLR_TODAY
 
         if self.selected_day_idx is not None and day_idx == self.selected_day_idx:
-            base = QColor(34, 197, 94, 30)
+            base = self._CLR_SEL
 
         return base
 
@@ -1065,41 +1565,18 @@ class   WeekTab(QWidget):
         if not item:
             return
 
-        start = QColor(34, 197, 94, 70)
-        end = self._base_cell_bg(col - 1)
-
-        anim = QPropertyAnimation(self.table, b"dummy")  # фиктивная привязка
-        anim.setDuration(180)
-
-
-        if not hasattr(self, "_anims"):
-            self._anims = []
-        self._anims.append(anim)
-
-        def step(value):
-            # value 0..1
-            a = float(value)
-            r = int(start.red() * (1 - a) + end.red() * a)
-            g = int(start.green() * (1 - a) + end.green() * a)
-            b = int(start.blue() * (1 - a) + end.blue() * a)
-            al = int(start.alpha() * (1 - a) + end.alpha() * a)
-            item.setBackground(QColor(r, g, b, al))
-
-        anim.valueChanged.connect(step)
-
-        def finished():
-            item.setBackground(end)
-            try:
-                self._anims.remove(anim)
-            except Exception:
-                pass
-
-        anim.finished.connect(finished)
-        anim.setStartValue(0.0)
-        anim.setEndValue(1.0)
+        # QVariantAnimation сам интерполирует QColor — без Python-кода на каждый кадр;
+        # вспышка гаснет поверх фона дня, который рисует CheckDelegate
+        anim = QVariantAnimation(self)
+        anim.setObjectName("cell_pulse")
+        anim.setStartValue(self._CLR_PULSE_START)
+        anim.setEndValue(self._CLR_PULSE_END)
         anim.setDuration(260)
         anim.setEasingCurve(QEasingCurve.OutCubic)
-        start = QColor(34, 197, 94, 120)
+        anim.valueChanged.connect(item.setBackground)
+        # анимацию держит родитель (self), после завершения она удаляет себя сама
+        anim.finished.connect(lambda: item.setData(Qt.BackgroundRole, None))
+        anim.finished.connect(anim.deleteLater)
         anim.start()
 
     def selected_task_from_list(self):
@@ -1140,12 +1617,14 @@ class   WeekTab(QWidget):
             QMessageBox.information(self, "Выбор", "Выбери активность слева.")
             return
         if QMessageBox.question(self, "Удалить?", f"Удалить активность: «{t['name']}» ?") == QMessageBox.Yes:
+            self.flush_pending()
             db_delete_activity(t["id"])
             self.load_data()
             self.on_db_changed()
 
     def reset_all(self):
         if QMessageBox.question(self, "Сбросить всё?", "Удалить ВСЕ активности и отметки?") == QMessageBox.Yes:
+            self.flush_pending()
             db_clear_all()
             self.load_data()
             self.on_db_changed()
@@ -1165,6 +1644,8 @@ class   WeekTab(QWidget):
 
 
 class StatsTab(QWidget):
+    _CLR_STAT_HI = QColor(34, 197, 94, 25)
+
     def __init__(self):
         super().__init__()
         root = QVBoxLayout(self)
@@ -1203,6 +1684,16 @@ class StatsTab(QWidget):
         self.table_days.verticalHeader().setVisible(False)
         self.table_days.setEditTriggers(QAbstractItemView.NoEditTriggers)
 
+        # ячейки переиспользуются между обновлениями — меняется только текст
+        self._acts_items: list[list[QTableWidgetItem]] = []
+        self._days_items: list[list[QTableWidgetItem]] = []
+        self.table_days.setRowCount(7)
+        for i, dn in enumerate(DAYS):
+            row_items = [QTableWidgetItem(dn), QTableWidgetItem(""), QTableWidgetItem("")]
+            for c, it in enumerate(row_items):
+                self.table_days.setItem(i, c, it)
+            self._days_items.append(row_items)
+
         root.addWidget(self.table_acts, 2)
         root.addWidget(self.table_days, 1)
 
@@ -1214,22 +1705,34 @@ class StatsTab(QWidget):
 
     def _calc_range_stats(self, start_d: date, end_d: date):
         activities = db_list_activities()
-        done_map = db_bulk_done_map(start_d.isoformat(), end_d.isoformat())
-
-        per_act = []
+        done_counts = db_done_weekday_counts(start_d.isoformat(), end_d.isoformat())
+
+        # план — сколько раз каждый день недели встречается в диапазоне;
+        # факт — проход только по выполненным отметкам, без перебора активность × день
+        ndays = max((end_d - start_d).days + 1, 0)
+        full_weeks, rest = divmod(ndays, 7)
+        first = start_d.weekday()
+        weekday_counts = [0] * 7
+        for k in range(7):
+            weekday_counts[(first + k) % 7] = full_weeks + (1 if k < rest else 0)
+
+        masks = {int(a_id): int(days_mask) & 127 for a_id, _, _, days_mask in activities}
+        done_by_act = dict.fromkeys(masks, 0)
         day_done = [0] * 7
+        for key, n in done_counts.items():
+            a_id, idx = key >> 3, key & 7
+            m = masks.get(a_id)
+            if m is None:
+                continue
+            if _MASK_TABLE[m][idx]:
+                done_by_act[a_id] += n
+                day_done[idx] += n
 
-        for a_id, name, mandatory, days_mask in activities:
-            planned = 0
-            done = 0
-            for d in daterange(start_d, end_d):
-                idx = d.weekday()
-                if mask_has_day(int(days_mask), idx):
-                    planned += 1
-                    if done_map.get((int(a_id), d.isoformat()), 0) == 1:
-                        done += 1
-                        day_done[idx] += 1
-            per_act.append((name, planned, done))
+        per_act = []
+        for a_id, name, _, _ in activities:
+            m = masks[int(a_id)]
+            planned = sum(c for c, on in zip(weekday_counts, _MASK_TABLE[m]) if on)
+            per_act.append((name, planned, done_by_act[int(a_id)]))
         return per_act, day_done
 
     def load_data(self):
@@ -1251,38 +1754,43 @@ class StatsTab(QWidget):
         m30 = {n: (p, d) for n, p, d in acts30}
         names = sorted(set(m30.keys()) | set(m7.keys()), key=lambda s: s.lower())
 
-        self.table_acts.setRowCount(len(names))
-        for r, n in enumerate(names):
-            p7, d7 = m7.get(n, (0, 0))
-            p30, d30 = m30.get(n, (0, 0))
-            pct7 = int(round((d7 / p7) * 100)) if p7 else 0
-            pct30 = int(round((d30 / p30) * 100)) if p30 else 0
-
-            self.table_acts.setItem(r, 0, QTableWidgetItem(n))
-            self.table_acts.setItem(r, 1, QTableWidgetItem(str(p7)))
-            self.table_acts.setItem(r, 2, QTableWidgetItem(str(d7)))
-            self.table_acts.setItem(r, 3, QTableWidgetItem(f"{pct7}%"))
-            self.table_acts.setItem(r, 4, QTableWidgetItem(str(p30)))
-            self.table_acts.setItem(r, 5, QTableWidgetItem(str(d30)))
-            self.table_acts.setItem(r, 6, QTableWidgetItem(f"{pct30}%"))
-
-        total_done = sum(day_done30)
-        self.table_days.setRowCount(7)
-        for i, dn in enumerate(DAYS):
-            done = day_done30[i]
-            share = int(round((done / total_done) * 100)) if total_done else 0
-            self.table_days.setItem(i, 0, QTableWidgetItem(dn))
-            self.table_days.setItem(i, 1, QTableWidgetItem(str(done)))
-            self.table_days.setItem(i, 2, QTableWidgetItem(f"{share}%"))
-
-        if any(day_done30):
+        with batch_table_update(self.table_acts, self.table_days):
+            self._resize_acts_rows(len(names))
+            acts_items = self._acts_items
+            for r, n in enumerate(names):
+                p7, d7 = m7.get(n, (0, 0))
+                p30, d30 = m30.get(n, (0, 0))
+                pct7 = int(round((d7 / p7) * 100)) if p7 else 0
+                pct30 = int(round((d30 / p30) * 100)) if p30 else 0
+
+                texts = (n, str(p7), str(d7), f"{pct7}%", str(p30), str(d30), f"{pct30}%")
+                for it, text in zip(acts_items[r], texts):
+                    if it.text() != text:
+                        it.setText(text)
+
+            total_done = sum(day_done30)
             mx = max(day_done30)
-            for i in range(7):
-                if day_done30[i] == mx and mx > 0:
-                    for c in range(3):
-                        item = self.table_days.item(i, c)
-                        if item:
-                            item.setBackground(QColor(34, 197, 94, 25))
+            for i, row_items in enumerate(self._days_items):
+                done = day_done30[i]
+                share = int(round((done / total_done) * 100)) if total_done else 0
+                row_items[1].setText(str(done))
+                row_items[2].setText(f"{share}%")
+                bg = self._CLR_STAT_HI if mx > 0 and done == mx else None
+                for it in row_items:
+                    it.setData(Qt.BackgroundRole, bg)
+
+    def _resize_acts_rows(self, n: int):
+        # строки добавляем/убираем только при изменении числа активностей
+        items = self._acts_items
+        if len(items) == n:
+            return
+        self.table_acts.setRowCount(n)
+        del items[n:]  # ячейки удалённых строк уничтожены вместе со строками
+        for r in range(len(items), n):
+            row_items = [QTableWidgetItem("") for _ in range(7)]
+            for c, it in enumerate(row_items):
+                self.table_acts.setItem(r, c, it)
+            items.append(row_items)
 
 
 # ---------- main ----------
@@ -1296,11 +1804,17 @@ class MainWindow(QMainWindow):
         self.resize(1300, 760)
 
         tabs = QTabWidget()
-        self.stats_tab = StatsTab()
-        self.week_tab = WeekTab(on_db_changed=self.stats_tab.load_data)
+        # статистика создаётся при первом открытии вкладки, а не на старте
+        self.stats_tab = None
+        self._stats_initialized = False
+        self._stats_host = QWidget()
+        self._stats_lay = QVBoxLayout(self._stats_host)
+        self._stats_lay.setContentsMargins(0, 0, 0, 0)
+        self.week_tab = WeekTab(on_db_changed=self.on_db_changed)
 
         tabs.addTab(self.week_tab, "Главная")
-        tabs.addTab(self.stats_tab, "Статистика")
+        tabs.addTab(self._stats_host, "Статистика")
+        tabs.currentChanged.connect(self.on_tab_changed)
 
         container = QWidget()
         root = QVBoxLayout(container)
@@ -1320,6 +1834,16 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(container)
         self.apply_theme()
 
+    def on_tab_changed(self, index: int):
+        if index == 1 and not self._stats_initialized:
+            self._stats_initialized = True
+            self.stats_tab = StatsTab()
+            self._stats_lay.addWidget(self.stats_tab)
+
+    def on_db_changed(self):
+        if self.stats_tab is not None:
+            self.stats_tab.load_data()
+
     def apply_theme(self):
         apply_palette(self.app, self.dark)
         if self.dark:
@@ -1333,12 +1857,30 @@ class MainWindow(QMainWindow):
         self.dark = not self.dark
         self.apply_theme()
 
+    def closeEvent(self, event):
+        self.week_tab.flush_pending()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
-    ensure_db_ok_or_rebuild()
-    db_init()
+    # полная integrity_check — только если прошлая проверка нашла ошибку
+    # или база не открывается; плановая проверка идёт в фоне
+    if load_meta().get("rebuild_pending"):
+        ensure_db_ok_or_rebuild()
+    try:
+        db_init()
+    except sqlite3.DatabaseError:
+        db_close()
+        ensure_db_ok_or_rebuild()
+        db_init()
+
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
     win = MainWindow(app)
     win.show()
+    if integrity_check_due():
+        # отдельный пул: долгая проверка не должна занимать поток, нужный StreakTask
+        integrity_pool = QThreadPool()
+        integrity_pool.setMaxThreadCount(1)
+        integrity_pool.start(IntegrityCheckTask())
     sys.exit(app.exec())